@@ -1,36 +1,26 @@
 import numpy as np
-import pandas as pd
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 import joblib
+import json
 
-# Set random seed for reproducibility
-np.random.seed(42)
+# Random generator with a fixed seed for reproducibility
+rng = np.random.default_rng(42)
 
-# Generate synthetic dataset
+# Generate synthetic dataset in one draw; columns are
+#   transaction_frequency        Transactions per month (0-20)
+#   avg_transaction_amount       Average amount in USD (10-200)
+#   utility_payment_consistency  Consistency score (0-1)
+#   airtime_topup_frequency      Top-ups per month (0-10)
 n_samples = 1000
-data = {
-    'transaction_frequency': np.random.uniform(0, 20, n_samples),  # Transactions per month (0-20)
-    'avg_transaction_amount': np.random.uniform(10, 200, n_samples),  # Average amount in USD (10-200)
-    'utility_payment_consistency': np.random.uniform(0, 1, n_samples),  # Consistency score (0-1)
-    'airtime_topup_frequency': np.random.uniform(0, 10, n_samples),  # Top-ups per month (0-10)
-}
-
-# Create DataFrame
-df = pd.DataFrame(data)
+scales = np.array([20, 190, 1, 10])
+offsets = np.array([0, 10, 0, 0])
+X = rng.random((n_samples, 4)) * scales + offsets
 
 # Create synthetic target variable
-df['score'] = (
-    0.3 * df['transaction_frequency'] +
-    0.2 * df['avg_transaction_amount'] +
-    0.4 * df['utility_payment_consistency'] * 10 +
-    0.1 * df['airtime_topup_frequency']
-)
-df['target'] = (df['score'] > df['score'].median()).astype(int)
-
-# Features and target
-X = df[['transaction_frequency', 'avg_transaction_amount', 'utility_payment_consistency', 'airtime_topup_frequency']]
-y = df['target']
+weights = np.array([0.3, 0.2, 0.4 * 10, 0.1])
+score = X @ weights
+y = (score > np.median(score)).astype(np.int8)
 
 # Scale features
 scaler = StandardScaler()
@@ -40,11 +30,23 @@ X_scaled = scaler.fit_transform(X)
 model = LogisticRegression(random_state=42)
 model.fit(X_scaled, y)
 
-# Save the model, scaler, and a background dataset for SHAP
+# Save the model and scaler
 joblib.dump(model, 'logistic_regression_model.pkl')
 joblib.dump(scaler, 'scaler.pkl')
-# Save a subset of scaled data (100 samples) for SHAP
+# SHAP for a linear model only needs the mean of the background set
+# (the first 100 scaled samples), so that is all that gets saved
 background_data = X_scaled[:100]
-joblib.dump(background_data, 'background_data.pkl')
 
-print("Model, scaler, and background data saved as 'logistic_regression_model.pkl', 'scaler.pkl', and 'background_data.pkl'")
+# Save the raw parameters the API needs for closed-form scoring and SHAP values
+params = {
+    "coef": model.coef_.tolist(),
+    "intercept": float(model.intercept_[0]),
+    "mean": scaler.mean_.tolist(),
+    "scale": scaler.scale_.tolist(),
+    "background_mean": background_data.mean(axis=0).tolist(),
+}
+with open('model_params.json', 'w') as f:
+    json.dump(params, f, indent=2)
+
+print("Model and scaler saved as 'logistic_regression_model.pkl' and 'scaler.pkl'")
+print("Model parameters saved as 'model_params.json'")
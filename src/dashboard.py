@@ -1,23 +1,18 @@
 import streamlit as st
 import requests
-import plotly.express as px
-import pandas as pd
-import sqlite3
-import shap
-import joblib
 import numpy as np
+from model_bundle import bundle
+
+# plotly is imported inside the branches that use it, so pages that only
+# call the API start faster.
+# Charts are built with plotly.graph_objects from plain lists; for rows this
+# small, building a pandas DataFrame costs more than drawing the chart.
 
 st.title("Micro-Loan Underwriting Assistant Dashboard")
 
 # API base URL
 BASE_URL = "http://127.0.0.1:8000"
 
-# Load SHAP explainer for visualizations
-model = joblib.load("logistic_regression_model.pkl")
-scaler = joblib.load("scaler.pkl")
-background_data = joblib.load("background_data.pkl")
-explainer = shap.LinearExplainer(model, background_data)
-
 # Sidebar for navigation
 page = st.sidebar.selectbox("Select Page", ["Loan Application", "User Progress", "Repayment"])
 
@@ -47,14 +42,14 @@ if page == "Loan Application":
                 st.success(f"Loan {result['decision']}!")
                 st.json(result)
                 # Visualize SHAP explanation
-                features = [transaction_frequency, avg_transaction_amount, utility_payment_consistency, airtime_topup_frequency]
-                features_scaled = scaler.transform([features])
-                shap_values = explainer(features_scaled)[0].values
-                shap_df = pd.DataFrame({
-                    "Feature": ["Transaction Frequency", "Avg Transaction Amount", "Utility Payment Consistency", "Airtime Top-up Frequency"],
-                    "SHAP Value": shap_values
-                })
-                fig = px.bar(shap_df, x="SHAP Value", y="Feature", title="SHAP Feature Importance")
+                import plotly.graph_objects as go
+                # Same closed-form SHAP values the API returns (see model_bundle.py)
+                params = bundle()
+                features = np.array([transaction_frequency, avg_transaction_amount, utility_payment_consistency, airtime_topup_frequency])
+                shap_values = params["W"] * (features - params["SHAP_BASE"])
+                feature_names = ["Transaction Frequency", "Avg Transaction Amount", "Utility Payment Consistency", "Airtime Top-up Frequency"]
+                fig = go.Figure(go.Bar(x=shap_values.tolist(), y=feature_names, orientation="h"))
+                fig.update_layout(title="SHAP Feature Importance", xaxis_title="SHAP Value", yaxis_title="Feature")
                 st.plotly_chart(fig)
             else:
                 st.error(f"Error: {response.json()['detail']}")
@@ -67,16 +62,27 @@ elif page == "User Progress":
         if response.status_code == 200:
             result = response.json()
             st.json(result)
+            import plotly.graph_objects as go
             # Visualize alternative data
             data = result["alternative_data"]
-            df = pd.DataFrame([data])
-            fig = px.bar(df, x=df.columns, y=df.values[0], title="Alternative Data Profile")
+            fig = go.Figure(go.Bar(x=list(data.keys()), y=list(data.values())))
+            fig.update_layout(title="Alternative Data Profile")
             st.plotly_chart(fig)
             # Visualize repayment history
             progress_map = result["gamification"]["progress_map"]
             if progress_map:
-                progress_df = pd.DataFrame(progress_map)
-                fig = px.scatter(progress_df, x="date", y="amount", color="status", title="Repayment History")
+                # One trace per status, matching the colour legend px.scatter produced
+                statuses = sorted({entry["status"] for entry in progress_map})
+                fig = go.Figure([
+                    go.Scatter(
+                        x=[entry["date"] for entry in progress_map if entry["status"] == status],
+                        y=[entry["amount"] for entry in progress_map if entry["status"] == status],
+                        mode="markers",
+                        name=status
+                    )
+                    for status in statuses
+                ])
+                fig.update_layout(title="Repayment History", xaxis_title="date", yaxis_title="amount", legend_title="status")
                 st.plotly_chart(fig)
             # Display gamification metrics
             st.metric("Repayment Streak", result["gamification"]["repayment_streak"])
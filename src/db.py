@@ -0,0 +1,14 @@
+import sqlite3
+import threading
+
+# Shared SQLite connection, opened once per process instead of per request
+conn = sqlite3.connect("loans.db", check_same_thread=False)
+# Rows are read by column name rather than position
+conn.row_factory = sqlite3.Row
+conn.execute("PRAGMA journal_mode=WAL")
+conn.execute("PRAGMA synchronous=NORMAL")
+conn.execute("PRAGMA temp_store=MEMORY")
+
+# A sqlite3 connection must not be used by two threads at once; hold this lock
+# around every use of conn. Reentrant so helpers can run inside a held lock.
+lock = threading.RLock()
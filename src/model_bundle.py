@@ -0,0 +1,30 @@
+import json
+from functools import lru_cache
+from typing import Dict
+
+import numpy as np
+
+# Scoring parameters shared by the API and the dashboard, loaded once per process
+@lru_cache(maxsize=1)
+def bundle() -> Dict:
+    # Load model parameters exported by create_model.py
+    try:
+        with open("model_params.json") as f:
+            params = json.load(f)
+        coef = np.array(params["coef"][0], dtype=np.float64)
+        scaler_mean = np.array(params["mean"], dtype=np.float64)
+        scaler_scale = np.array(params["scale"], dtype=np.float64)
+        background_mean = np.array(params["background_mean"], dtype=np.float64)
+    except Exception as e:
+        raise RuntimeError(f"Failed to load model parameters: {str(e)}")
+
+    # Fold the scaler into the model so scoring is a single dot product:
+    # z = coef . (x - mean) / scale + intercept = W . x + B
+    # Folding is done in float64; the folded weights are stored as float32,
+    # which is ample precision for a 0-100 score.
+    W = (coef / scaler_scale).astype(np.float32)
+    B = float(np.float32(params["intercept"] - np.dot(coef / scaler_scale, scaler_mean)))
+    # LinearExplainer's SHAP value for feature i is coef[i] * (x_scaled[i] - E[x_scaled[i]]),
+    # which in raw units is W[i] * (x[i] - SHAP_BASE[i])
+    SHAP_BASE = (scaler_mean + scaler_scale * background_mean).astype(np.float32)
+    return {"W": W, "B": B, "SHAP_BASE": SHAP_BASE}